@@ -1,25 +1,35 @@
 import os
+import sys
 import argparse
-import collections
 import contextlib
 import wave
+import mmap
+import struct
+import numpy as np
 import webrtcvad
 import yt_dlp
 import csv
 import json
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the segmenter then runs as plain Python
+    njit = None
+
+_VIDEO_ID_RES = [re.compile(p) for p in (
+    r'(?:youtube\.com\/watch\?v=)([a-zA-Z0-9_-]{11})',
+    r'(?:youtube\.com\/embed\/)([a-zA-Z0-9_-]{11})',
+    r'(?:youtu\.be\/)([a-zA-Z0-9_-]{11})',
+    r'(?:youtube\.com\/v\/)([a-zA-Z0-9_-]{11})'
+)]
 
 def extract_video_id(youtube_url):
     """Extract YouTube video ID from URL."""
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=)([a-zA-Z0-9_-]{11})',
-        r'(?:youtube\.com\/embed\/)([a-zA-Z0-9_-]{11})',
-        r'(?:youtu\.be\/)([a-zA-Z0-9_-]{11})',
-        r'(?:youtube\.com\/v\/)([a-zA-Z0-9_-]{11})'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, youtube_url)
+    for rx in _VIDEO_ID_RES:
+        match = rx.search(youtube_url)
         if match:
             return match.group(1)
     return None
@@ -33,6 +43,10 @@ def download_audio(youtube_url, output_file="input.wav"):
             'preferredcodec': 'wav',
             'preferredquality': '192',
         }],
+        # Have the extraction pass emit mono, 16kHz WAV directly
+        'postprocessor_args': {
+            'extractaudio': ['-ac', '1', '-ar', '16000'],
+        },
     }
     
     # Get video metadata
@@ -56,84 +70,170 @@ def download_audio(youtube_url, output_file="input.wav"):
         # Then download
         ydl.download([youtube_url])
 
-    # Ensure mono, 16kHz WAV
-    import subprocess
-    
     # Check if yt-dlp created a file with double extension
     double_ext_file = output_file + ".wav"
-    actual_input_file = double_ext_file if os.path.exists(double_ext_file) else output_file
+    if os.path.exists(double_ext_file):
+        os.replace(double_ext_file, output_file)
     
-    if not os.path.exists(actual_input_file):
-        raise FileNotFoundError(f"Downloaded audio file not found: {actual_input_file}")
-    
-    fixed_file = "input_fixed.wav"
-    subprocess.run([
-        "ffmpeg", "-y", "-i", actual_input_file,
-        "-ac", "1", "-ar", "16000", fixed_file
-    ], check=True)
-    
-    # Remove the original downloaded file (which might have double extension)
-    if os.path.exists(actual_input_file):
-        os.remove(actual_input_file)
-    
-    # Move the fixed file to the desired output location
-    os.rename(fixed_file, output_file)
+    if not os.path.exists(output_file):
+        raise FileNotFoundError(f"Downloaded audio file not found: {output_file}")
     
     return metadata
 
 
-class Frame(object):
-    def __init__(self, bytes, timestamp, duration):
-        self.bytes = bytes
-        self.timestamp = timestamp
-        self.duration = duration
-
-def frame_generator(frame_duration_ms, audio, sample_rate):
-    n = int(sample_rate * (frame_duration_ms / 1000.0) * 2)
-    offset = 0
-    timestamp = 0.0
-    duration = (float(n) / sample_rate) / 2.0
-    while offset + n <= len(audio):
-        yield Frame(audio[offset:offset + n], timestamp, duration)
-        timestamp += duration
-        offset += n
-
-def vad_collector(sample_rate, frame_duration_ms, padding_duration_ms, vad, frames):
-    num_padding_frames = int(padding_duration_ms / frame_duration_ms)
-    ring_buffer = collections.deque(maxlen=num_padding_frames)
-    triggered = False
-    voiced_frames = []
-    segments = []
+def frame_arrays(frame_duration_ms, audio, sample_rate):
+    """Return (frames, samples_per_frame); frames is a NumPy view over the PCM buffer."""
+    if sample_rate == 16000 and frame_duration_ms == 30:
+        # The pipeline's default (yt-dlp emits 16kHz), so skip the float math
+        n = 480
+    else:
+        n = int(sample_rate * (frame_duration_ms / 1000.0))
+    total = len(audio) // (2 * n) * n * 2
+    frames = np.frombuffer(audio[:total], dtype=np.int16).reshape(-1, n)
+    return frames, n
 
-    for frame in frames:
-        is_speech = vad.is_speech(frame.bytes, sample_rate)
+def speech_bitmap(vad, frames, sample_rate):
+    """Run the VAD over every frame up front, returning a uint8 decision per frame."""
+    return np.fromiter((vad.is_speech(f.tobytes(), sample_rate) for f in frames),
+                       dtype=np.uint8, count=frames.shape[0])
 
+def silero_speech_bitmap(frames, sample_rate, model_path="silero_vad.onnx", threshold=0.5, num_streams=8):
+    """Score every frame with Silero VAD v4 (ONNX), carrying the LSTM state between windows.
+
+    The audio is cut into num_streams contiguous streams that are batched
+    together, so each run call advances every stream by one window.
+    """
+    import onnxruntime as ort
+
+    if sample_rate not in (8000, 16000):
+        raise ValueError(f"Silero VAD supports 8000 or 16000 Hz audio, got {sample_rate}")
+    num_windows = frames.shape[0]
+    if num_windows == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    num_streams = min(num_streams, num_windows)
+    stream_len = -(-num_windows // num_streams)
+    # Zero-pad the tail so the windows split evenly into (streams, steps, samples)
+    windows = np.zeros((num_streams * stream_len, frames.shape[1]), dtype=np.float32)
+    windows[:num_windows] = frames / 32768.0
+    windows = windows.reshape(num_streams, stream_len, -1)
+
+    sr = np.array(sample_rate, dtype=np.int64)
+    h = np.zeros((2, num_streams, 64), dtype=np.float32)
+    c = np.zeros((2, num_streams, 64), dtype=np.float32)
+    probs = np.empty((num_streams, stream_len), dtype=np.float32)
+    for step in range(stream_len):
+        out, h, c = sess.run(None, {"input": windows[:, step], "sr": sr, "h": h, "c": c})
+        probs[:, step] = out.reshape(-1)
+    return (probs.reshape(-1)[:num_windows] > threshold).astype(np.uint8)
+
+def _maybe_njit(fn):
+    return njit(cache=True)(fn) if njit is not None else fn
+
+@_maybe_njit
+def _collect_segments(speech, num_padding_frames, threshold):
+    # Every closed segment spans at least two frames, which bounds the output
+    segments = np.empty((len(speech) // 2 + 1, 2), dtype=np.int64)
+    num_segments = 0
+    triggered = False
+    window_start = 0  # first frame still in the (virtual) ring buffer
+    voiced_count = 0
+    segment_start = 0
+
+    for i in range(len(speech)):
+        if i - window_start >= num_padding_frames:
+            # Oldest frame rotates out of the ring buffer
+            voiced_count -= speech[i - num_padding_frames]
+        voiced_count += speech[i]
         if not triggered:
-            ring_buffer.append((frame, is_speech))
-            num_voiced = len([f for f, speech in ring_buffer if speech])
-            if num_voiced > 0.9 * ring_buffer.maxlen:
+            if voiced_count > threshold:
                 triggered = True
-                for f, s in ring_buffer:
-                    voiced_frames.append(f)
-                ring_buffer.clear()
+                segment_start = max(window_start, i + 1 - num_padding_frames)
+                window_start = i + 1
+                voiced_count = 0
         else:
-            voiced_frames.append(frame)
-            ring_buffer.append((frame, is_speech))
-            num_unvoiced = len([f for f, speech in ring_buffer if not speech])
-            if num_unvoiced > 0.9 * ring_buffer.maxlen:
+            unvoiced_count = min(i + 1 - window_start, num_padding_frames) - voiced_count
+            if unvoiced_count > threshold:
                 triggered = False
-                segment_start = voiced_frames[0].timestamp
-                segment_end = voiced_frames[-1].timestamp + voiced_frames[-1].duration
-                segments.append((segment_start, segment_end))
-                ring_buffer.clear()
-                voiced_frames = []
-    if voiced_frames:
-        segment_start = voiced_frames[0].timestamp
-        segment_end = voiced_frames[-1].timestamp + voiced_frames[-1].duration
-        segments.append((segment_start, segment_end))
-    return segments
-
-def split_with_vad(input_file="input.wav", out_dir="clips", video_id=None, aggressiveness=2, start_padding=1.0, end_padding=0.5):
+                segments[num_segments, 0] = segment_start
+                segments[num_segments, 1] = i + 1
+                num_segments += 1
+                window_start = i + 1
+                voiced_count = 0
+    if triggered:
+        segments[num_segments, 0] = segment_start
+        segments[num_segments, 1] = len(speech)
+        num_segments += 1
+    return segments[:num_segments]
+
+def vad_collector(frame_duration_ms, padding_duration_ms, speech, samples_per_frame):
+    """Yield (start_sample, end_sample) for each voiced segment.
+
+    The frame bounds are computed up front in one pass over the bitmap;
+    only the conversion to samples happens lazily, row by row.
+    """
+    if frame_duration_ms == 30 and padding_duration_ms == 300:
+        num_padding_frames = 10
+    else:
+        num_padding_frames = int(padding_duration_ms / frame_duration_ms)
+    if njit is None:
+        # Plain Python indexes a list far faster than a NumPy array
+        speech = speech.tolist()
+    bounds = _collect_segments(speech, num_padding_frames, 0.9 * num_padding_frames)
+    for start_frame, end_frame in bounds:
+        yield (int(start_frame) * samples_per_frame, int(end_frame) * samples_per_frame)
+
+def _map_wav_data(input_file, sample_width):
+    """Memory-map a WAV file and return a zero-copy view of its data chunk."""
+    with open(input_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:4] != b'RIFF' or mm[8:12] != b'WAVE':
+        raise wave.Error(f"Not a RIFF/WAVE file: {input_file}")
+
+    # Walk the chunks rather than assuming a 44-byte header (ffmpeg adds LIST)
+    pos = 12
+    while pos + 8 <= len(mm):
+        chunk_id = mm[pos:pos + 4]
+        chunk_size = struct.unpack_from('<I', mm, pos + 4)[0]
+        if chunk_id == b'data':
+            start = pos + 8
+            # Streamed WAVs may carry a placeholder size, so clamp to the file
+            data_len = min(chunk_size, len(mm) - start)
+            data_len -= data_len % sample_width
+            return memoryview(mm)[start:start + data_len]
+        pos += 8 + chunk_size + (chunk_size & 1)
+    raise wave.Error(f"No data chunk found in {input_file}")
+
+@lru_cache(maxsize=16)
+def _silence(nbytes):
+    # bytes are immutable, so one buffer can back every clip and every video
+    return b'\x00' * nbytes
+
+def _wav_header(sample_rate, data_len):
+    """Canonical 44-byte header for mono 16-bit PCM."""
+    return struct.pack('<4sI4s4sIHHIIHH4sI',
+                       b'RIFF', 36 + data_len, b'WAVE',
+                       b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+                       b'data', data_len)
+
+def _write_wav(task):
+    out_path, sample_rate, chunks = task
+    bufs = [_wav_header(sample_rate, sum(len(chunk) for chunk in chunks)), *chunks]
+    fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        # Header and payload go out in one vectored write where available
+        written = os.writev(fd, bufs) if hasattr(os, 'writev') else 0
+        for buf in bufs:
+            view = memoryview(buf)[written:]
+            written = max(written - len(buf), 0)
+            while view:
+                view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    return out_path
+
+def split_with_vad(input_file="input.wav", out_dir="clips", video_id=None, aggressiveness=2, start_padding=1.0, end_padding=0.5, vad_backend="webrtc", silero_model="silero_vad.onnx", write_workers=None):
     with contextlib.closing(wave.open(input_file, 'rb')) as wf:
         num_channels = wf.getnchannels()
         assert num_channels == 1
@@ -141,23 +241,40 @@ def split_with_vad(input_file="input.wav", out_dir="clips", video_id=None, aggre
         assert sample_width == 2
         sample_rate = wf.getframerate()
         assert sample_rate in (8000, 16000, 32000, 48000)
-        pcm_data = wf.readframes(wf.getnframes())
-        total_duration = len(pcm_data) / (sample_rate * sample_width)
 
-    vad = webrtcvad.Vad(aggressiveness)
-    frames = list(frame_generator(30, pcm_data, sample_rate))
-    segments = vad_collector(sample_rate, 30, 300, vad, frames)
+    # Map the PCM instead of reading it; the mapping is released once the
+    # last view into pcm_data goes away
+    pcm_data = _map_wav_data(input_file, sample_width)
+    total_duration = len(pcm_data) / (sample_rate * sample_width)
+
+    if vad_backend == "silero":
+        # Silero scores 512-sample windows at 16kHz (256 at 8kHz)
+        frame_duration_ms = 32
+        frames, samples_per_frame = frame_arrays(frame_duration_ms, pcm_data, sample_rate)
+        speech = silero_speech_bitmap(frames, sample_rate, silero_model)
+    else:
+        frame_duration_ms = 30
+        frames, samples_per_frame = frame_arrays(frame_duration_ms, pcm_data, sample_rate)
+        speech = speech_bitmap(webrtcvad.Vad(aggressiveness), frames, sample_rate)
 
     if not os.path.exists(out_dir):
         os.makedirs(out_dir)
 
+    # Create silent padding for start and end, shared by every clip
+    start_padding_frames = int(start_padding * sample_rate)
+    end_padding_frames = int(end_padding * sample_rate)
+    start_silence_bytes = _silence(start_padding_frames * sample_width)
+    end_silence_bytes = _silence(end_padding_frames * sample_width)
+
     # Prepare CSV data
     csv_data = []
+    write_tasks = []
     clip_counter = 1
 
-    for i, (start, end) in enumerate(segments):
-        duration = end - start
-        if duration < 4 or duration > 10:
+    # Segments are filtered and queued one at a time as vad_collector yields them
+    for start_sample, end_sample in vad_collector(frame_duration_ms, 300, speech, samples_per_frame):
+        num_samples = end_sample - start_sample
+        if num_samples < 4 * sample_rate or num_samples > 10 * sample_rate:
             continue
             
         # Create clip filename with new naming convention
@@ -167,29 +284,17 @@ def split_with_vad(input_file="input.wav", out_dir="clips", video_id=None, aggre
             clip_name = f"clip_{clip_counter:03d}.wav"
         
         # Extract original audio segment (without extending boundaries)
-        with contextlib.closing(wave.open(input_file, 'rb')) as wf:
-            wf.setpos(int(start * sample_rate))
-            frames_to_read = int(duration * sample_rate)
-            audio_data = wf.readframes(frames_to_read)
-        
-        # Create silent padding for start and end
-        start_padding_frames = int(start_padding * sample_rate)
-        end_padding_frames = int(end_padding * sample_rate)
-        start_silence_bytes = b'\x00' * (start_padding_frames * sample_width)
-        end_silence_bytes = b'\x00' * (end_padding_frames * sample_width)
-        
-        # Combine: start padding + audio + end padding
-        padded_data = start_silence_bytes + audio_data + end_silence_bytes
-        padded_duration = duration + start_padding + end_padding
+        audio_data = pcm_data[start_sample * sample_width:end_sample * sample_width]
             
+        # Write start padding + audio + end padding without concatenating them
         out_path = os.path.join(out_dir, clip_name)
-        with wave.open(out_path, 'wb') as out_f:
-            out_f.setnchannels(1)
-            out_f.setsampwidth(2)
-            out_f.setframerate(sample_rate)
-            out_f.writeframes(padded_data)
+        write_tasks.append((out_path, sample_rate, (start_silence_bytes, audio_data, end_silence_bytes)))
         
-        # Add to CSV data (essential info only)
+        # Add to CSV data (essential info only); seconds only from here on
+        start = start_sample / sample_rate
+        end = end_sample / sample_rate
+        duration = num_samples / sample_rate
+        padded_duration = duration + start_padding + end_padding
         csv_data.append({
             'clip_name': clip_name,
             'start_time': round(start, 2),
@@ -200,9 +305,13 @@ def split_with_vad(input_file="input.wav", out_dir="clips", video_id=None, aggre
             'end_padding_seconds': end_padding
         })
         
-        print(f"Saved {out_path}")
         clip_counter += 1
 
+    # Clip writes are independent, so overlap them across threads
+    with ThreadPoolExecutor(max_workers=write_workers or os.cpu_count()) as executor:
+        for out_path in executor.map(_write_wav, write_tasks):
+            print(f"Saved {out_path}")
+
     # Save CSV file
     csv_path = os.path.join(out_dir, 'clips_metadata.csv')
     with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
@@ -223,39 +332,30 @@ def save_metadata_json(metadata, output_dir):
             json.dump(metadata, jsonfile, indent=2, ensure_ascii=False)
         print(f"Video metadata saved to {json_path}")
 
-def main():
-    parser = argparse.ArgumentParser(description="YouTube Audio Downloader & VAD Splitter")
-    parser.add_argument("url", help="YouTube video URL")
-    parser.add_argument("--output", default="input.wav", help="Output WAV filename")
-    parser.add_argument("--base_dir", default=".", help="Base directory to create video folder")
-    parser.add_argument("--vad_level", type=int, default=2, help="VAD aggressiveness (0-3)")
-    parser.add_argument("--start_padding", type=float, default=1.0, help="Silent padding in seconds to add to beginning of clips (default: 1.0)")
-    parser.add_argument("--end_padding", type=float, default=0.5, help="Silent padding in seconds to add to end of clips (default: 0.5)")
-    args = parser.parse_args()
-
+def process_one_url(url, base_dir=".", vad_level=2, start_padding=1.0, end_padding=0.5, vad_backend="webrtc", silero_model="silero_vad.onnx", write_workers=None):
+    """Download, split and write metadata for a single YouTube URL."""
     # Extract video ID
-    video_id = extract_video_id(args.url)
+    video_id = extract_video_id(url)
     if not video_id:
-        print("Error: Could not extract video ID from URL")
-        return
+        print(f"Error: Could not extract video ID from URL: {url}")
+        return None
 
     # Create video-specific directory
-    output_dir = os.path.join(args.base_dir, video_id)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    output_dir = os.path.join(base_dir, video_id)
+    os.makedirs(output_dir, exist_ok=True)
 
     # Set paths for temporary and output files
     temp_audio_file = os.path.join(output_dir, "temp_audio.wav")
 
     print(f"Processing video ID: {video_id}")
     print("Downloading audio...")
-    metadata = download_audio(args.url, temp_audio_file)
+    metadata = download_audio(url, temp_audio_file)
     
     print("Saving video metadata...")
     save_metadata_json(metadata, output_dir)
     
     print("Splitting with VAD...")
-    clip_data = split_with_vad(temp_audio_file, output_dir, video_id, aggressiveness=args.vad_level, start_padding=args.start_padding, end_padding=args.end_padding)
+    clip_data = split_with_vad(temp_audio_file, output_dir, video_id, aggressiveness=vad_level, start_padding=start_padding, end_padding=end_padding, vad_backend=vad_backend, silero_model=silero_model, write_workers=write_workers)
     
     # Clean up temporary audio file
     if os.path.exists(temp_audio_file):
@@ -264,6 +364,69 @@ def main():
     print(f"Done! Created {len(clip_data)} clips in '{output_dir}' directory")
     print(f"- Audio clips: {video_id}-001.wav, {video_id}-002.wav, ...")
     print(f"- Metadata: clips_metadata.csv and metadata.json")
+    return clip_data
+
+def _process_url_worker(url, **kwargs):
+    # yt-dlp errors do not always pickle, so report failures from the worker
+    try:
+        return process_one_url(url, **kwargs) is not None
+    except Exception as e:
+        print(f"Error processing {url}: {e}")
+        return False
+
+def read_urls_file(path):
+    """Read one URL per line, skipping blank lines and # comments."""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def main():
+    parser = argparse.ArgumentParser(description="YouTube Audio Downloader & VAD Splitter")
+    parser.add_argument("url", nargs="?", help="YouTube video URL")
+    parser.add_argument("--urls_file", help="Text file with one YouTube URL per line, processed in parallel")
+    parser.add_argument("--output", default="input.wav", help="Output WAV filename")
+    parser.add_argument("--base_dir", default=".", help="Base directory to create video folder")
+    parser.add_argument("--vad_level", type=int, default=2, help="VAD aggressiveness (0-3)")
+    parser.add_argument("--vad_backend", choices=["webrtc", "silero"], default="webrtc", help="VAD engine to use (default: webrtc)")
+    parser.add_argument("--silero_model", default="silero_vad.onnx", help="Path to the Silero VAD v4 ONNX model (used with --vad_backend silero)")
+    parser.add_argument("--start_padding", type=float, default=1.0, help="Silent padding in seconds to add to beginning of clips (default: 1.0)")
+    parser.add_argument("--end_padding", type=float, default=0.5, help="Silent padding in seconds to add to end of clips (default: 0.5)")
+    args = parser.parse_args()
+
+    urls = [args.url] if args.url else []
+    if args.urls_file:
+        urls += read_urls_file(args.urls_file)
+    if not urls:
+        parser.error("provide a URL or --urls_file")
+
+    # Two URLs for the same video would share (and delete) one temp_audio.wav
+    seen = set()
+    unique_urls = []
+    for url in urls:
+        key = extract_video_id(url) or url
+        if key in seen:
+            print(f"Skipping duplicate video: {url}")
+            continue
+        seen.add(key)
+        unique_urls.append(url)
+    urls = unique_urls
+
+    options = dict(base_dir=args.base_dir, vad_level=args.vad_level,
+                   start_padding=args.start_padding, end_padding=args.end_padding,
+                   vad_backend=args.vad_backend, silero_model=args.silero_model)
+    if len(urls) == 1:
+        if process_one_url(urls[0], **options) is None:
+            sys.exit(1)
+        return
+
+    # Separate processes, since download, ffmpeg and VAD are not all thread-safe.
+    # Split the cores between them so clip writers don't multiply to cpu_count**2.
+    num_workers = min(os.cpu_count() or 1, len(urls))
+    options['write_workers'] = max(1, (os.cpu_count() or 1) // num_workers)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = list(executor.map(partial(_process_url_worker, **options), urls))
+    if not all(results):
+        print(f"{results.count(False)} of {len(urls)} URLs failed")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()